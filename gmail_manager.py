@@ -1,7 +1,9 @@
 import os
 import re
+import sys
 
 from lxml import html  # lxml's HTML parser + XPath support
+from lxml import etree  # HOW: etree.XPath compiles an XPath expression once so we can reuse it
 from html import escape as html_escape
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -23,6 +25,7 @@ from google.oauth2.credentials import Credentials  # HOW: reads gmail_token.json
 from googleapiclient.discovery import build        # HOW: constructs Gmail API client
 from google.auth.transport.requests import Request # HOW: refreshes tokens via requests (respects proxies)
 import base64                                      # HOW: decode base64url-encoded message bodies
+import requests                                    # HOW: pooled keep-alive Session for the plain REST calls
 
 from dotenv import load_dotenv
 from datetime import datetime
@@ -39,50 +42,118 @@ GOOGLE_TOKEN_JSON = os.environ.get("GMAIL_CREDS_FILE_PATH", "secrets/gmail_token
 
 START_PERIOD = "2d"  # the period used for the search criteria, change to 2d
 END_PERIOD = "0d"
+GMAIL_API_URL = "https://gmail.googleapis.com/gmail/v1"
+GMAIL_BATCH_SIZE = 50  # gets per batch request; Gmail allows up to 100 but recommends <= 50 to avoid rate limiting
+
+# Regexes are compiled once at import instead of on every call; each message runs through these several times.
+_NUM_RE = re.compile(r"[^\d.\-]")  # anything that is NOT a digit, dot or minus (see _parse_amount)
+# str.translate table that deletes every ascii character except digits, dot and minus (the fast path in _parse_amount)
+_AMOUNT_KEEP = frozenset("0123456789.-")
+_AMOUNT_DEL = dict.fromkeys(i for i in range(128) if chr(i) not in _AMOUNT_KEEP)
+# The fields of one email are matched by ONE alternation regex, so finditer sweeps the text once instead of once per field.
+# Each alternative has its own named group; m.lastgroup tells us which field a match is.
+_CARD_FIELDS_RE = re.compile(
+    r"Date\s*&?\s*Time:\s*(?P<dt>[0-9]{1,2}\s+[A-Za-z]{3}\s+\d{2}:\d{2}\s*\([A-Z]+\))"  # "Date & Time: 26 Sep 11:56 (SGT)"
+    r"|Amount:(?P<amt>\s*[A-Z]{3}\s*-?\d[\d,]*(?:\.\d+)?)"  # "Amount: SGD 10.00"
+)
+_INCOME_FIELDS_RE = re.compile(
+    r"Amount:(?P<amt>\s*[A-Z]{3}\s*-?\d[\d,]*(?:\.\d+)?)"  # "Amount: SGD 10.00"
+    r"|received(?P<rcv>\s*[A-Z]{3}\s*-?\d[\d,]*(?:\.\d+)?)"  # "You have received SGD 10.00"
+    r"|(?i:\bon\s+(?P<on>\d{1,2}\s+\w{3}\s+\d{4}\s+\d{2}:\d{2}\s+SGT)\b)"  # "... on 24 Sep 2025 18:09 SGT" ((?i:...) = case-insensitive for this part only)
+)
+_RECIPIENT_RE = re.compile(r"To\s*:(.*)", re.S)  # run on ONE text node; 🟨 no re.I on purpose, we want it to match To: exactly!
+
+# Labels extract_paylah_fields cares about, normalized (lowercase, no trailing colon).
+# Interned (like the keys _norm_label returns), so the `in` check usually ends at a pointer compare.
+_PAYLAH_LABELS = frozenset(sys.intern(label) for label in ("date & time", "amount", "to"))
+
+# All the date formats DBS alerts are known to use, in the order convert_date tries them.
+_DATE_FMTS = (
+    "%d %b %Y %H:%M",  # case: 26 Sep 2025 11:56
+    "%d %b %H:%M %Y",  # case: 26 Sep 11:56 2025
+    "%d %b %H:%M",  # case: 26 Sep 11:56 (no year)
+)
+
+# One tuned HTML parser shared by every parse (see _parse_html).
+# - collect_ids=False: we never look anything up by id, so don't build the id table
+# - remove_comments=True: comments are never part of the text we match on
+# - encoding="utf-8": we hand lxml utf-8 bytes, which it parses faster than a python str
+# NOTE: remove_blank_text is deliberately NOT used; dropping whitespace-only text between rows/blocks
+#       glues words together in text_content() (e.g. "... SGTFrom:") and breaks the \b-anchored regexes.
+_HTML_PARSER = html.HTMLParser(collect_ids=False, remove_comments=True, encoding="utf-8")
+
+# XPath expressions compiled once (same idea as the regexes above), instead of re-parsing the expression per call.
+# $label is an XPath variable, filled in per call: _TEXT_AFTER_STRONG_XPATH(doc, label="From:")
+_TEXT_AFTER_STRONG_XPATH = etree.XPath("//strong[normalize-space()=$label]/following-sibling::text()[1]")
 
 
 def convert_date(raw_date: str) -> str:
-    current_date = datetime.now()
     clean_date = raw_date.replace("(SGT)", "").replace("SGT", "").strip()  # since sometimes it can get SGT or (SGT)
 
-    # note we want to catch ALL POSSIBLE formats thats why we loop through all the known date formats instead of a simple try except block (can only catch 2 formats)
-    for fmt in [
-        "%d %b %Y %H:%M",  # case: 26 Sep 2025 11:56
-        "%d %b %H:%M %Y",  # case: 26 Sep 11:56 2025
-        "%d %b %H:%M"  # case: 26 Sep 11:56 (no year)
-    ]:
+    # guess the format from the shape of the string first, so the common case is ONE strptime call
+    # (every failed strptime raises a ValueError, and exceptions are not cheap)
+    parts = clean_date.split()
+    if len(parts) == 4 and parts[2].isdigit():
+        guessed_fmt = _DATE_FMTS[0]  # year comes 3rd -> 26 Sep 2025 11:56
+    elif len(parts) == 4:
+        guessed_fmt = _DATE_FMTS[1]  # year comes last -> 26 Sep 11:56 2025
+    elif len(parts) == 3:
+        guessed_fmt = _DATE_FMTS[2]  # no year at all -> 26 Sep 11:56
+    else:
+        guessed_fmt = None
+
+    dt = ""
+    if guessed_fmt:
         try:
-            dt = datetime.strptime(clean_date,
-                                   fmt)  # if can successfully format the date, BREAK OUT OF THIS FOR LOOP, otherwise dt will convert into empty string in the next round
-            # If no year in string → fill manually
-            if dt.year == 1900:
-                dt = dt.replace(year=current_date.year)
-            break
+            dt = datetime.strptime(clean_date, guessed_fmt)
         except ValueError:
             dt = ""
-            continue
+
+    if not dt:
+        # note we still want to catch ALL POSSIBLE formats if the guess was wrong, thats why we loop through all the known date formats instead of a simple try except block (can only catch 2 formats)
+        for fmt in _DATE_FMTS:
+            try:
+                dt = datetime.strptime(clean_date,
+                                       fmt)  # if can successfully format the date, BREAK OUT OF THIS FOR LOOP, otherwise dt will convert into empty string in the next round
+                break
+            except ValueError:
+                dt = ""
+                continue
+
+    # If no year in string → fill manually (only look up the current year when we actually need it)
+    if dt and dt.year == 1900:
+        current_year = datetime.now().year
+        dt = dt.replace(year=current_year)
 
     formatted_date = dt.strftime("%Y-%m-%d")
     return formatted_date
 
 
+def _parse_html(html_str: str):
+    """Parse an email's HTML into an lxml tree with the shared _HTML_PARSER. lxml will tolerate imperfect markup."""
+    return html.fromstring((html_str or "").encode("utf-8"), parser=_HTML_PARSER)
+
+
 def _clean_text(s: str) -> str:
     """Normalize any text we extract from HTML."""
-    if s is None:
+    if not s:
         return ""
-    # Collapse runs of whitespace (\s is any whitespace, like tabs/newlines/multiple spaces; + means one or more) to a single space
-    s = re.sub(r"\s+", " ", s)
-    # Trim leading/trailing whitespace
-    return s.strip()
+    # Fast path: most table cells are already clean (e.g. 'SGD 12.30'), so once trimmed there is nothing to collapse.
+    # Every whitespace character except the plain space is non-printable, so if the string is printable and has no
+    # double space, it has no runs of whitespace and we can return it as-is (no list of pieces to build + join).
+    s = s.strip()
+    if "  " not in s and s.isprintable():
+        return s
+    # str.split() with no argument splits on runs of ANY whitespace (tabs/newlines/multiple spaces) and drops the
+    # leading/trailing ones, so joining the pieces back with " " collapses + trims in a single C-level pass (no regex).
+    return " ".join(s.split())
 
 
 def _norm_label(s: str) -> str:
     """Turn a label like 'Amount:' or '  Date & Time : ' into a uniform key. norm stands for normalize."""
-    s = _clean_text(s)  # converts all the whitespaces to a normal space for easier parsing
-    s = s.rstrip(
-        ":")  # drops any trailing colon(s) if present; .strip() is for both ends, if no argument is provided it just trims spaces. .lstrip() trims the front.
-    s = s.casefold()  # case-insensitive (stronger than .lower())
-    return s
+    # same whitespace collapse as _clean_text, then drop any trailing colon(s) and casefold (case-insensitive, stronger than .lower())
+    # sys.intern hands back the one shared copy of the string, so comparing it to _PAYLAH_LABELS is an identity check
+    return sys.intern(" ".join(s.split()).rstrip(":").casefold()) if s else ""
 
 
 def _parse_amount(s: str) -> dict:
@@ -90,11 +161,17 @@ def _parse_amount(s: str) -> dict:
     raw = _clean_text(s)
     out = {"amount_raw": raw, "amount_num": None}
     # Keep only digits, dot, or minus (strip 'SGD', commas, spaces, etc.)
-    # inside [...] is a character class. ^ at the start of a class means 'not these.'
-    # \d = digit 0-9; . = literal dot; \- = literal minus; without the \, d is just the literal d. inside of a character class, the . is a literal dot so \. is optional; usually . means any character
-    # \ forces a literal hyphen, otherwise it can refer to a range like a-z.
-    # So we remove everything that is NOT a digit, dot, or minus.
-    num = re.sub(r"[^\d.\-]", "", raw)
+    # Amounts are (almost) always plain ascii, so the fast path is str.translate with a precomputed delete-table, which
+    # drops every other ascii character in one C-level pass.
+    if raw.isascii():
+        num = raw.translate(_AMOUNT_DEL)
+    else:
+        # Rare non-ascii input (e.g. unicode digits/spaces): translate's table only covers ascii, so use the regex instead.
+        # inside [...] is a character class. ^ at the start of a class means 'not these.'
+        # \d = digit 0-9; . = literal dot; \- = literal minus; without the \, d is just the literal d. inside of a character class, the . is a literal dot so \. is optional; usually . means any character
+        # \ forces a literal hyphen, otherwise it can refer to a range like a-z.
+        # So we remove everything that is NOT a digit, dot, or minus.
+        num = _NUM_RE.sub("", raw)
 
     out["amount_num"] = float(num) if num else None  # out["amount_num"] = None if there's no num
 
@@ -103,34 +180,42 @@ def _parse_amount(s: str) -> dict:
 
 def extract_paylah_fields(html_str: str) -> dict:
     """Extract the items: Date & Time, Amount, To FROM THE HTML."""
-    # Parse the HTML into a tree. lxml will tolerate imperfect markup.
-    doc = html.fromstring(html_str or "")
+    # Parse the HTML into a tree (shared parser, see _parse_html), then read its rows
+    return _paylah_from_doc(_parse_html(html_str))
+
+
+def _paylah_from_doc(doc) -> dict:
+    """Same as extract_paylah_fields, but works on an already parsed doc (see extract_all)."""
+    # doc.iter("tr") walks the tree lazily, so we stop walking as soon as all the fields are found
+    return _paylah_from_rows(doc.iter("tr"))
 
-    # Labels we care about, normalized (lowercase, no trailing colon)
-    wanted = {"date & time", "amount", "to"}
 
+def _paylah_from_rows(rows) -> dict:
+    """Read the Date & Time, Amount and To rows out of an iterable of <tr> elements."""
     # Prepare the output dictionary with consistent keys
     result = {"date_time": None, "amount": None, "amount_num": None, "to": None}
+    found = set()  # which of the wanted labels we have seen so far
 
-    # Iterate every table row that has at least one <td>
-    # XPath //tr[td] means: “any <tr> anywhere that contains a <td> child”
-    for tr in doc.xpath("//tr[td]"):
-
-        # What does tr, td mean:
-        # In HTML tables: <table> contains rows <tr>, and a row contains cells <td>.
-        # XPath //tr[td] selects all <tr> elements that have at least one <td> child anywhere in the document.
+    # What does tr, td mean:
+    # In HTML tables: <table> contains rows <tr>, and a row contains cells <td>.
+    for tr in rows:
+        # Grab the <td> cells of this row directly from its children (no XPath engine needed per row).
+        tds = tr.findall("td")
+        if not tds:
+            continue  # only rows that have at least one <td> can hold a label
 
         # Get the text content of the FIRST <td>, aka cell, of the row.
         # This gets all the text in the FIRST cell (for eg. Date & Time:) of that row.
-        label_text = tr.xpath("td[1]")[0].text_content()
+        # ("".join(itertext()) is the same as .text_content())
+        label_text = "".join(tds[0].itertext())
         label_norm = _norm_label(label_text)  # normalize like 'Amount:' -> 'amount'
 
-        if label_norm in wanted:
-            # Get the SECOND <td> (the value cell)
-            val_node = tr.xpath("td[2]")  # a list with just 1 element, so [0] gets that element
+        if label_norm in _PAYLAH_LABELS:
+            # Get the SECOND <td> (the value cell), if the row has one
+            val_node = tds[1] if len(tds) > 1 else None
 
             # Extract *all* text inside that cell (handles nested tags)
-            value = _clean_text(val_node[0].text_content()) if val_node else ""
+            value = _clean_text("".join(val_node.itertext())) if val_node is not None else ""
 
             if label_norm == "date & time":
                 result["date_time"] = value
@@ -141,19 +226,28 @@ def extract_paylah_fields(html_str: str) -> dict:
             elif label_norm == "to":
                 result["to"] = value
 
+            found.add(label_norm)
+            if len(found) == len(_PAYLAH_LABELS):
+                break  # all three found (they sit near the top of the alert), no need to read the rest
+
     return result
 
 
 def get_text_after_strong_element(doc, label: str) -> str | None:
     # Find <strong> whose text equals the label (e.g., "From:") and take the next text node
     # following-sibling::text()[1] gives the immediate text after </strong>
-    nodes = doc.xpath(f"//strong[normalize-space()='{label}']/following-sibling::text()[1]")
+    nodes = _TEXT_AFTER_STRONG_XPATH(doc, label=label)
     return _clean_text(nodes[0]) if nodes else None
 
 
 def extract_amount_received(html_str: str):
     """will do as a future feature"""
-    doc = html.fromstring(html_str or "")
+    doc = _parse_html(html_str)
+    return _income_from_doc(doc, _clean_text(doc.text_content()))
+
+
+def _income_from_doc(doc, txt: str) -> dict:
+    """Same as extract_amount_received, but works on an already parsed doc + its cleaned text (see extract_all)."""
     out = {"amount_raw": None, "amount": None, "date_time": None,
            "from": get_text_after_strong_element(doc, "From:"),
            "to": get_text_after_strong_element(doc, "To:")}
@@ -161,48 +255,105 @@ def extract_amount_received(html_str: str):
     # 1) From / To via <strong> tails (in the dictionary aka the 'get_text_after_strong_element(doc, "From:")')
 
     # 2) Amount + DateTime from the “You have received … on …” sentence
-    # Grab a compact text dump of the main content block
-    txt = _clean_text(doc.text_content())
-
-    # Amount like “SGD 10.00”
-    money_amount = re.search(r"Amount:(\s*[A-Z]{3}\s*-?\d[\d,]*(?:\.\d+)?)", txt) or re.search(
-        r"received(\s*[A-Z]{3}\s*-?\d[\d,]*(?:\.\d+)?)", txt)  # this is a regex object
-    if money_amount:
-        out["amount_raw"] = money_amount.group(1)  # amount raw contains the 'SGD' along with it
-        # .group(1) just means get the text within the first parenthesis; the .group(0) is the WHOLE string that is matched. since the entire string we want to match is in () that is why .group(0) & .group(1) is the same.
+    # txt is a compact text dump of the main content block
+
+    # One sweep over txt picks up the first match of each field:
+    # - amount like “SGD 10.00”, after “Amount:” (preferred) or else after “received”
+    # - date like “24 Sep 2025 18:09 SGT” after “ on ”
+    amount_raw = received_raw = None
+    for m in _INCOME_FIELDS_RE.finditer(txt):  # each m is a regex match object
+        field = m.lastgroup  # name of the group that matched, e.g. 'amt'
+        if field == "amt" and amount_raw is None:
+            amount_raw = m.group("amt")
+        elif field == "rcv" and received_raw is None:
+            received_raw = m.group("rcv")
+        elif field == "on" and out["date_time"] is None:
+            out["date_time"] = m.group("on")
+        if amount_raw is not None and out["date_time"] is not None:
+            break  # got everything we need, no point scanning the rest
+
+    money_amount = amount_raw if amount_raw is not None else received_raw
+    if money_amount is not None:
+        out["amount_raw"] = money_amount  # amount raw contains the 'SGD' along with it
         out["amount"] = _parse_amount(out["amount_raw"])['amount_num']  # since _parse_amount returns a dict
 
-    # Date like “24 Sep 2025 18:09 SGT” after “ on ”
-    money_datetime = re.search(r"\bon\s+(\d{1,2}\s+\w{3}\s+\d{4}\s+\d{2}:\d{2}\s+SGT)\b", txt, flags=re.I)
-    if money_datetime:
-        out["date_time"] = money_datetime.group(1)
-
     return out
 
 
-def extract_card_transaction(html_str: str):
-    card_doc = html.fromstring(html_str or "")
-    out = {"amount_raw": None, "amount": None, "date_time": None, "to": None}
+def _text_after_to_label(doc) -> str | None:
+    """
+    Find the recipient after the first 'To:' in the parsed tree.
+    itertext() yields the text nodes in document order, and a text node always stops at the next tag,
+    so the rest of the node after 'To:' is the recipient (and we stop walking as soon as we find it).
+    """
+    for chunk in doc.itertext():
+        recipient = _RECIPIENT_RE.search(chunk)
+        if recipient:
+            value = _clean_text(recipient.group(1))  # 🟨 Clean spacing; avoids capturing following sentences.
+            if value:
+                return value
+            # nothing after 'To:' before the next tag (e.g. <strong>To:</strong>), keep looking
+    return None
+
 
+def extract_card_transaction(html_str: str):
+    card_doc = _parse_html(html_str)
     # grab the text
     text = _clean_text(card_doc.text_content())
+    return _card_from_doc(card_doc, text)
+
 
-    # match the text
-    transaction_time = re.search(r"Date\s*&?\s*Time:\s*([0-9]{1,2}\s+[A-Za-z]{3}\s+\d{2}:\d{2}\s*\([A-Z]+\))", text)
-    if transaction_time:
-        out['date_time'] = _clean_text(transaction_time.group(1))
+def _card_from_doc(card_doc, text: str) -> dict:
+    """Same as extract_card_transaction, but works on an already parsed doc + its cleaned text (see extract_all)."""
+    out = {"amount_raw": None, "amount": None, "date_time": None, "to": None}
 
-    raw_amount = re.search(r"Amount:(\s*[A-Z]{3}\s*-?\d[\d,]*(?:\.\d+)?)", text)
-    if raw_amount:
-        out['amount_raw'] = raw_amount.group(1)
-        out['amount'] = _parse_amount(raw_amount.group(1))['amount_num']
+    # match the text: one sweep picks up the first "Date & Time:" and the first "Amount:"
+    for m in _CARD_FIELDS_RE.finditer(text):
+        if m.lastgroup == "dt" and out['date_time'] is None:
+            out['date_time'] = _clean_text(m.group("dt"))
+        elif m.lastgroup == "amt" and out['amount_raw'] is None:
+            out['amount_raw'] = m.group("amt")
+            out['amount'] = _parse_amount(out['amount_raw'])['amount_num']
+        if out['date_time'] is not None and out['amount_raw'] is not None:
+            break  # both found, stop scanning
 
-    recipient = re.search(r"To\s*:\s*([^<]+?)\s*(?=<)", html_str)  # 🟨 Re.I means case insensitive. but we want it to match To: exactly!
-    if recipient:
-        out['to'] = _clean_text(recipient.group(1))  # 🟨 Clean spacing; avoids capturing following sentences.
+    out['to'] = _text_after_to_label(card_doc)
 
     return out
 
+
+def extract_all(html_str: str, kind: str | None = None) -> tuple[dict, dict, dict]:
+    """
+    Run the extractors on ONE parsed tree.
+    Parsing the HTML (and dumping its text) is the expensive part, so we do it once per message
+    instead of once per extractor. Returns (paylah_details, income_details, card_transaction_details).
+
+    kind is the message kind from GmailManager.get_all_messages():
+    - "card"  -> only the card transaction extractor runs
+    - "alert" -> the PayLah extractor runs, and the income one only if it wasn't a PayLah expense
+                 (an alert is one or the other, just like the if/elif in main.py)
+    - None    -> all three run (kind unknown)
+    Skipped extractors return their usual empty result (every value None), so callers don't need to care.
+    """
+    doc = _parse_html(html_str)
+    text = None  # text dump of the whole doc, shared by the income + card extractors; only made if one of them runs
+
+    paylah_details = {"date_time": None, "amount": None, "amount_num": None, "to": None}
+    income_details = {"amount_raw": None, "amount": None, "date_time": None, "from": None, "to": None}
+    card_details = {"amount_raw": None, "amount": None, "date_time": None, "to": None}
+
+    if kind != "card":  # a card transaction alert never matches the PayLah table or the “received … on …” sentence
+        paylah_details = _paylah_from_doc(doc)  # only reads the table rows, doesn't need the text dump
+        if kind is None or not paylah_details["date_time"]:
+            text = _clean_text(doc.text_content())
+            income_details = _income_from_doc(doc, text)
+    if kind != "alert":
+        if text is None:
+            text = _clean_text(doc.text_content())
+        card_details = _card_from_doc(doc, text)
+    return paylah_details, income_details, card_details
+
+
 class GmailManager:
     def __init__(self):
         # ─────────────────────────────────────────────────────────────────────
@@ -221,8 +372,10 @@ class GmailManager:
                 # will use the google-auth fallback in get_all_messages().
                 print(f"[gmail] simplegmail init failed, will use google-auth fallback: {e}")
 
-        # [ADDED] Placeholder for google-auth Gmail service. Created on demand.
+        # [ADDED] Placeholders for google-auth creds, Gmail service and REST session. Created on demand.
+        self._ga_creds = None
         self._ga_service = None
+        self._ga_session = None
 
     # ─────────────────────────────────────────────────────────────────────────
     # [ADDED] Helper: build a google-auth Gmail service using gmail_token.json.
@@ -230,9 +383,9 @@ class GmailManager:
     #      oauth2client/httplib2. Auto-refreshes access tokens if refresh is valid.
     # HOW: Requires a gmail_token.json created via InstalledAppFlow with access_type=offline.
     # ─────────────────────────────────────────────────────────────────────────
-    def _build_google_service(self):
-        if self._ga_service:
-            return self._ga_service
+    def _get_google_creds(self):
+        if self._ga_creds:
+            return self._ga_creds
 
         # Read google-auth style gmail_token.json (SCOPES are baked into the file)
         creds = Credentials.from_authorized_user_file(GOOGLE_TOKEN_JSON)
@@ -246,49 +399,110 @@ class GmailManager:
                     "Re-run OAuth locally to create a google-auth gmail_token.json and upload it. "
                     f"(expected at: {GOOGLE_TOKEN_JSON})"
                 )
+        self._ga_creds = creds
+        return creds
+
+    def _build_google_service(self):
+        if self._ga_service:
+            return self._ga_service
         # cache_discovery=False avoids file writes in restricted environments
-        self._ga_service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+        self._ga_service = build("gmail", "v1", credentials=self._get_google_creds(), cache_discovery=False)
         return self._ga_service
 
     # ─────────────────────────────────────────────────────────────────────────
-    # [ADDED] Helper: recursively extract the HTML body from Gmail API payloads.
+    # [ADDED] Helper: a plain requests.Session carrying the same google-auth token.
+    # WHY: the Session keeps ONE TLS connection to gmail.googleapis.com open and
+    #      reuses it, and a direct GET skips the discovery client's per-call
+    #      request building. Used for the simple users.messages.list calls.
+    # HOW: bearer token from the (refreshed) creds; still goes through requests,
+    #      so HTTPS_PROXY on PythonAnywhere is respected like before.
+    #      (message bodies still go through _batch_get: one batch POST for up to
+    #      GMAIL_BATCH_SIZE messages beats even a kept-alive GET per message.)
+    # ─────────────────────────────────────────────────────────────────────────
+    def _build_google_session(self):
+        if self._ga_session:
+            return self._ga_session
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {self._get_google_creds().token}"
+        self._ga_session = session
+        return session
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # [ADDED] Helper: extract the HTML body from Gmail API payloads.
     # WHY: Your code expects 'message.html' like simplegmail provided.
-    # HOW: We traverse parts to find 'text/html'; if missing, fall back to text/plain.
+    # HOW: We walk ALL the parts (explicit stack, no recursion) looking for 'text/html';
+    #      only if there is none anywhere do we fall back to the first text/plain part.
+    #      (a multipart/alternative mail usually lists text/plain BEFORE text/html,
+    #      so returning the first thing we can decode would pick the plain version.)
     # ─────────────────────────────────────────────────────────────────────────
     def _extract_html_from_payload(self, payload) -> str:
         if not payload:
             return ""
-        mime = (payload.get("mimeType") or "").lower()
-        body = payload.get("body", {}) or {}
-        data = body.get("data")
-        if mime == "text/html" and data:
-            try:
-                return base64.urlsafe_b64decode(data.encode("utf-8")).decode("utf-8", errors="ignore")
-            except Exception:
-                return ""
-        # If multipart, look into parts
-        for part in (payload.get("parts") or []):
-            html_str = self._extract_html_from_payload(part)
-            if html_str:
-                return html_str
+        plain_fallback = None
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            mime = (part.get("mimeType") or "").lower()
+            data = (part.get("body") or {}).get("data")
+            if mime == "text/html" and data:
+                try:
+                    # urlsafe_b64decode accepts the (ascii) str directly, no need to .encode() it first
+                    return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+                except Exception:
+                    pass  # undecodable part, keep looking
+            elif mime == "text/plain" and data and plain_fallback is None:
+                plain_fallback = data
+            # If multipart, look into parts (reversed so they pop off the stack in their original order)
+            stack.extend(reversed(part.get("parts") or []))
         # Fallback: return text/plain wrapped minimally so downstream parsers still work
-        if mime == "text/plain" and data:
+        if plain_fallback:
             try:
-                text = base64.urlsafe_b64decode(data.encode("utf-8")).decode("utf-8", errors="ignore")
+                text = base64.urlsafe_b64decode(plain_fallback).decode("utf-8", errors="ignore")
                 return f"<pre>{html_escape(text)}</pre>"
             except Exception:
                 return ""
         return ""
 
+    # ─────────────────────────────────────────────────────────────────────────
+    # [CHANGED] Helper: fetch many messages with batch requests instead of one .execute() each.
+    # WHY: every .execute() is its own HTTPS round-trip; a batch packs up to
+    #      GMAIL_BATCH_SIZE gets into ONE HTTP POST, so N round-trips become ~N/GMAIL_BATCH_SIZE.
+    # HOW: each sub-request is tagged with its list position (request_id), the callback
+    #      stores the response under it, and we return the responses in the original order.
+    #      get_kwargs are passed to messages().get(), e.g. format="full", fields="payload"
+    #      (fields asks Gmail to only send back the part we actually read).
+    # ─────────────────────────────────────────────────────────────────────────
+    def _batch_get(self, service, message_ids, **get_kwargs) -> list:
+        responses = {}
+
+        def _on_response(request_id, response, exception):
+            responses[request_id] = (response, exception)
+
+        for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=_on_response)
+            for pos in range(start, min(start + GMAIL_BATCH_SIZE, len(message_ids))):
+                batch.add(service.users().messages().get(userId="me", id=message_ids[pos], **get_kwargs),
+                          request_id=str(pos))
+            batch.execute()
+
+        out = []
+        for pos in range(len(message_ids)):
+            response, exception = responses[str(pos)]
+            if exception is not None:
+                raise exception  # same as before: a failed get stops the run instead of silently dropping a message
+            out.append(response)
+        return out
+
     # ─────────────────────────────────────────────────────────────────────────
     # [ADDED] Lightweight message wrapper so callers can keep using 'message.html'
     # WHY: Your loop expects objects with a .html attribute (from simplegmail).
     # HOW: We return instances of this class when using google-auth fallback.
     # ─────────────────────────────────────────────────────────────────────────
     class _Msg:
-        def __init__(self, html_str: str, id_: str):
+        def __init__(self, html_str: str, id_: str, kind: str | None = None):
             self.html = html_str
             self.id = id_
+            self.kind = kind  # "card" or "alert", i.e. which query returned it (see get_all_messages)
 
     def get_all_messages(self):
         # ----------------------------------------------------------------------------
@@ -296,6 +510,9 @@ class GmailManager:
         # ----------------------------------------------------------------------------
         query1 = f'newer_than:{START_PERIOD} older_than:{END_PERIOD} from:(paylah.alert@dbs.com OR ibanking.alert@dbs.com) subject:(card transaction alert)'
         query2 = f'newer_than:{START_PERIOD} older_than:{END_PERIOD} from:(paylah.alert@dbs.com OR ibanking.alert@dbs.com) subject:(alerts)'
+        # [ADDED] Every message is tagged with the kind of the query that returned it, so main.py
+        # only runs the extractors that can actually match it (see extract_all).
+        # query1 -> "card" (card transaction alerts), query2 -> "alert" (PayLah expenses / income received)
 
         # ─────────────────────────────────────────────────────────────────────────
         # [CHANGED] Try simplegmail first (preserves your original behavior).
@@ -305,9 +522,14 @@ class GmailManager:
         # ─────────────────────────────────────────────────────────────────────────
         if self.gmail is not None:
             try:
-                msgs = self.gmail.get_messages(query=query1)
-                msgs += self.gmail.get_messages(query=query2)
-                return msgs  # same objects as before (have .html)
+                card_msgs = self.gmail.get_messages(query=query1)
+                alert_msgs = self.gmail.get_messages(query=query2)
+                # run each query separately so we can tag the results before concatenating
+                for m in card_msgs:
+                    m.kind = "card"
+                for m in alert_msgs:
+                    m.kind = "alert"
+                return card_msgs + alert_msgs  # same objects as before (have .html), plus .kind
             except Exception as e:
                 # Common failures:
                 # - oauth2client.client.HttpAccessTokenRefreshError (invalid_grant)
@@ -318,19 +540,28 @@ class GmailManager:
         # [ADDED] Fallback: use the Gmail REST API via google-auth.
         # WHY: Works behind PythonAnywhere's proxy and handles token refresh with requests.
         # HOW: Reuses the *same query strings* you already built.
-        #      We list message IDs, then fetch each message (format='full') and
-        #      extract an HTML body, wrapping into _Msg(html, id).
+        #      We list message IDs, fetch them (format='full') in batches and
+        #      extract an HTML body, wrapping into _Msg(html, id, kind).
         # ─────────────────────────────────────────────────────────────────────────
         service = self._build_google_service()
+        session = self._build_google_session()
 
         def _fetch_ids(q):
-            resp = service.users().messages().list(userId="me", q=q, maxResults=100).execute()
-            return [m["id"] for m in resp.get("messages", [])]
-
-        ids = _fetch_ids(query1) + _fetch_ids(query2)
+            r = session.get(f"{GMAIL_API_URL}/users/me/messages", params={"q": q, "maxResults": 100}, timeout=30)
+            r.raise_for_status()
+            return [m["id"] for m in r.json().get("messages", [])]
+
+        # the same message can come back from both queries; keep the first (query1's) tag
+        ids, seen = [], set()
+        for message_id, query_kind in [(i, "card") for i in _fetch_ids(query1)] + [(i, "alert") for i in _fetch_ids(query2)]:
+            if message_id not in seen:
+                seen.add(message_id)
+                ids.append((message_id, query_kind))
+
+        # full bodies in batches (see _batch_get); each message keeps the tag of the query that returned it
+        fulls = self._batch_get(service, [message_id for message_id, _ in ids], format="full", fields="payload")
         out = []
-        for message_id in ids:
-            m = service.users().messages().get(userId="me", id=message_id, format="full").execute()
+        for (message_id, kind), m in zip(ids, fulls):
             html_str = self._extract_html_from_payload(m.get("payload"))
-            out.append(GmailManager._Msg(html_str=html_str, id_=message_id))
-        return out
\ No newline at end of file
+            out.append(GmailManager._Msg(html_str=html_str, id_=message_id, kind=kind))
+        return out
@@ -4,18 +4,35 @@ import os
 from telebot import TeleBot
 from dotenv import load_dotenv
 import time
+import threading
+import shelve
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 
 TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN") or "No bot token given"
 CHAT_ID = os.environ.get("CHAT_ID") or "No chat token given"
+MAX_WORKERS = 8  # how many messages are processed at the same time
+# on-disk cache of parsed emails (message id -> extracted details), so the next scheduled run doesn't re-parse them
+EXTRACT_CACHE_PATH = os.environ.get("EXTRACT_CACHE_PATH") or ".gmail_extract_cache"
 
 gmail_bot = gmail_manager.GmailManager()
 notion_bot = notion_manager.NotionManager()
 telegram_bot = TeleBot(token=TOKEN)
 
-# convert the amount data to floats since everything are strings right now
-latest_amounts_in_record = [float(amount) for amount in notion_bot.latest_amounts_in_record]
+# convert the amount data to floats (Notion may hand back ints); rows with an empty Amount are skipped
+latest_amounts_in_record = [float(amount) for amount in notion_bot.latest_amounts_in_record if amount is not None]
+
+
+def _to_cents(amount):
+    # round amounts to cents before comparing, so float noise (e.g. 0.1 + 0.2) can't break the duplicate check
+    return round(amount, 2) if amount is not None else None
+
+
+# sets for the "is this already in notion?" checks below: `x in some_set` is O(1), `x in some_list` scans the whole list
+_latest_amounts = {_to_cents(amount) for amount in latest_amounts_in_record}
+_latest_dates = set(notion_bot.latest_dates_in_record)
+_latest_names = set(notion_bot.latest_names_in_record)
 msgs = gmail_bot.get_all_messages()
 
 print("OK. Messages fetched:", len(msgs))
@@ -33,26 +50,73 @@ def send_telegram_message(text, retries=5):
     print("[telegram] Failed after retries")
     return False
 
-if msgs:
-    for message in msgs:
-        # print(message.html)
-        payment_details = gmail_manager.extract_paylah_fields(message.html)
-        income_details = gmail_manager.extract_amount_received(message.html)
-        card_transaction_details = gmail_manager.extract_card_transaction(message.html)
-        # save it to notion database
-
-        # send the message
-        if payment_details["date_time"]:
-            message_to_send = f"⬇️ New expense:\n🗓️DATE: {payment_details['date_time']}\n💵AMOUNT: {payment_details['amount']}\n🧍RECIPIENT: {payment_details['to']}"
-            send_message_status = send_telegram_message(message_to_send)
-            print("Send telegram message status:", send_message_status)
-
-            converted_date = gmail_manager.convert_date(payment_details['date_time'])
-            if converted_date not in notion_bot.latest_dates_in_record or payment_details['amount_num'] not in latest_amounts_in_record or payment_details['to'] not in notion_bot.latest_names_in_record:
+# only one thread at a time may run the "already in notion?" check + add_row (+ _remember_row), so two threads
+# handling the same transaction (e.g. an email returned by both gmail queries) can't both insert it
+notion_lock = threading.Lock()
+
+
+def _add_row(record_name, record_date, record_amount):
+    # call with notion_lock held: insert the row, then remember it so the next duplicate check sees it
+    notion_bot.add_row(record_name=record_name, record_date=record_date, record_amount=record_amount)
+    _remember_row(record_name, record_date, record_amount)
+
+
+def _remember_row(record_name, record_date, record_amount):
+    # keep the sets and notion_bot's (index-aligned) lists in step with what is now in notion
+    _latest_dates.add(record_date)
+    _latest_amounts.add(_to_cents(record_amount))
+    _latest_names.add(record_name)
+    notion_bot.latest_dates_in_record.append(record_date)
+    notion_bot.latest_amounts_in_record.append(record_amount)
+    notion_bot.latest_names_in_record.append(record_name)
+
+# shelve is not thread-safe, so every read/write of the cache goes through cache_lock
+extract_cache = shelve.open(EXTRACT_CACHE_PATH)
+cache_lock = threading.Lock()
+
+
+def _cache_key(message):
+    # the same email always has the same gmail id; kind is part of the key since it decides which extractors ran
+    message_id = getattr(message, "id", None)
+    return f"{message_id}:{getattr(message, 'kind', None)}" if message_id is not None else None
+
+
+def extract_details(message):
+    """gmail_manager.extract_all() for this message, memoized on disk by message id (the 2 day search window means
+    every scheduled run sees the same emails again)."""
+    key = _cache_key(message)
+    if key is not None:
+        with cache_lock:
+            cached = extract_cache.get(key)
+        if cached is not None:
+            return cached
+
+    details = gmail_manager.extract_all(message.html, kind=getattr(message, "kind", None))
+    if key is not None:
+        with cache_lock:
+            extract_cache[key] = details
+    return details
+
+
+def _process_message(message):
+    # print(message.html)
+    # parse the html ONCE (or not at all if an earlier run already did), and only run the extractors that can match this kind of email
+    payment_details, income_details, card_transaction_details = extract_details(message)
+    # save it to notion database
+
+    # send the message
+    if payment_details["date_time"]:
+        message_to_send = f"⬇️ New expense:\n🗓️DATE: {payment_details['date_time']}\n💵AMOUNT: {payment_details['amount']}\n🧍RECIPIENT: {payment_details['to']}"
+        send_message_status = send_telegram_message(message_to_send)
+        print("Send telegram message status:", send_message_status)
+
+        converted_date = gmail_manager.convert_date(payment_details['date_time'])
+        with notion_lock:  # see notion_lock above
+            if converted_date not in _latest_dates or _to_cents(payment_details['amount_num']) not in _latest_amounts or payment_details['to'] not in _latest_names:
                 # ADD THE DATA TO NOTION
-                notion_bot.add_row(record_name=payment_details['to'], record_date=converted_date, record_amount=payment_details['amount_num'])
+                _add_row(record_name=payment_details['to'], record_date=converted_date, record_amount=payment_details['amount_num'])
                 print('SUCCESS!')
-            elif payment_details['to'] in notion_bot.latest_names_in_record:
+            elif payment_details['to'] in _latest_names:
                 # in the rare case that payment is made to the same merchant
                 indexes_of_recipient = [i for i, name in enumerate(notion_bot.latest_names_in_record) if name == payment_details['to']]
                 can_create_record = True
@@ -60,23 +124,24 @@ if msgs:
                     if notion_bot.latest_dates_in_record[i] == converted_date:
                         can_create_record = False
                 if can_create_record:
-                    notion_bot.add_row(record_name=payment_details['to'], record_date=converted_date,
-                                       record_amount=payment_details['amount_num'])
+                    _add_row(record_name=payment_details['to'], record_date=converted_date,
+                             record_amount=payment_details['amount_num'])
                     print('SUCCESS!')
 
-        elif income_details["date_time"]:
-            # print(convert_date(income_details['date_time']))
-            message_to_send = f"⬆️ New INCOME:\n🗓️DATE: {income_details['date_time']}\n💰AMOUNT: {income_details['amount_raw']}\nPAYEE: {income_details['from']}"
-            send_message_status = send_telegram_message(message_to_send)
-            print("Send telegram message status:", send_message_status)
+    elif income_details["date_time"]:
+        # print(convert_date(income_details['date_time']))
+        message_to_send = f"⬆️ New INCOME:\n🗓️DATE: {income_details['date_time']}\n💰AMOUNT: {income_details['amount_raw']}\nPAYEE: {income_details['from']}"
+        send_message_status = send_telegram_message(message_to_send)
+        print("Send telegram message status:", send_message_status)
 
-        elif card_transaction_details["date_time"]:
-            converted_date = gmail_manager.convert_date(card_transaction_details['date_time'])
-            # print(card_transaction_details['to'])
-            if converted_date not in notion_bot.latest_dates_in_record or card_transaction_details['amount'] not in latest_amounts_in_record or card_transaction_details['to'] not in notion_bot.latest_names_in_record:
-                notion_bot.add_row(record_name=card_transaction_details['to'], record_date=converted_date, record_amount=card_transaction_details['amount'])
+    elif card_transaction_details["date_time"]:
+        converted_date = gmail_manager.convert_date(card_transaction_details['date_time'])
+        # print(card_transaction_details['to'])
+        with notion_lock:  # see notion_lock above
+            if converted_date not in _latest_dates or _to_cents(card_transaction_details['amount']) not in _latest_amounts or card_transaction_details['to'] not in _latest_names:
+                _add_row(record_name=card_transaction_details['to'], record_date=converted_date, record_amount=card_transaction_details['amount'])
 
-            elif card_transaction_details['to'] in notion_bot.latest_names_in_record:
+            elif card_transaction_details['to'] in _latest_names:
                 # in the rare case that payment is made to the same merchant
                 indexes_of_recipient = [i for i, name in enumerate(notion_bot.latest_names_in_record) if
                                         name == card_transaction_details['to']]
@@ -85,10 +150,27 @@ if msgs:
                     if notion_bot.latest_dates_in_record[i] == converted_date:
                         can_create_record = False
                 if can_create_record:
-                    notion_bot.add_row(record_name=card_transaction_details['to'], record_date=converted_date,
-                                       record_amount=card_transaction_details['amount'])
+                    _add_row(record_name=card_transaction_details['to'], record_date=converted_date,
+                             record_amount=card_transaction_details['amount'])
                     print('SUCCESS!')
 
-            message_to_send = f"💳️ New expense:\n🗓️DATE: {card_transaction_details['date_time']}\n💵AMOUNT: {card_transaction_details['amount_raw']}\n🧍RECIPIENT: {card_transaction_details['to']}"
-            send_message_status = send_telegram_message(message_to_send)
-            print("Send telegram message status:", send_message_status)
\ No newline at end of file
+        message_to_send = f"💳️ New expense:\n🗓️DATE: {card_transaction_details['date_time']}\n💵AMOUNT: {card_transaction_details['amount_raw']}\n🧍RECIPIENT: {card_transaction_details['to']}"
+        send_message_status = send_telegram_message(message_to_send)
+        print("Send telegram message status:", send_message_status)
+
+try:
+    if msgs:
+        # each message is independent and most of the time is spent waiting on telegram/notion, so run them in threads.
+        # a message that fails doesn't stop the others; list(...) waits for all of them and then re-raises the first
+        # exception a message hit. telegram messages arrive in whatever order the threads finish.
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            list(executor.map(_process_message, msgs))
+
+        # forget emails that have dropped out of the search window, so the cache doesn't grow forever
+        current_keys = {_cache_key(message) for message in msgs}
+        for key in list(extract_cache.keys()):
+            if key not in current_keys:
+                del extract_cache[key]
+finally:
+    extract_cache.close()  # flushes the cache to disk
+
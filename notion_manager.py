@@ -1,12 +1,27 @@
 import os
+import time
 import requests
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# orjson (if installed) encodes/decodes the Notion JSON noticeably faster than the stdlib json module.
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    _ORJSON_AVAILABLE = False
 
 NOTION_TOKEN = os.getenv("NOTION_API_TOKEN")  # Notion integration token (starts with ntn_ or secret_)
 DS_ID  = os.getenv("NOTION_DB_ID")     # IMPORTANT: this must be your DATA SOURCE ID
 ACCOUNT_PAGE_ID = os.getenv("ACCOUNT_PAGE_ID")
 FILTER_QUERY = {"property": "Date", "date": {"is_not_empty": True}} # we want to ignore any rows without dates.
 SORT_QUERY = [{"property": "Date", "direction": "descending"}]  # latest first aka descending
-PAGE_SIZE = 50
+PAGE_SIZE = 100  # Notion returns at most 100 rows per query page
+ADD_ROWS_WORKERS = 8  # max inserts add_rows sends at the same time
+SCHEMA_TTL = 3600  # seconds a fetched data source schema is reused before we ask Notion again
 
 H = {
     "Authorization": f"Bearer {NOTION_TOKEN}",
@@ -14,26 +29,98 @@ H = {
     "Content-Type": "application/json",
 }
 
+# ── 1) One shared Session for every Notion call ──────────────────────────────
+# requests.get/post open a brand new TCP+TLS connection to api.notion.com each time;
+# a Session keeps the connection alive and reuses it across pagination and row inserts.
+# It also carries the headers, so we don't pass headers=H on every call.
+# The adapter retries transient failures (rate limit 429 / 5xx), honouring Notion's Retry-After.
+class _NotionRetry(Retry):
+    """
+    urllib3 Retry that also retries a POST (queries and add_row/add_rows), but ONLY when Notion answers 429:
+    a rate-limited request was never run, so sending it again can't create a duplicate row.
+    Any other POST failure is not replayed, because Notion may already have created the page:
+    - a 5xx response
+    - an error once the request was sent (read timeout, dropped connection); POST stays out of allowed_methods
+      and increment() re-raises these straight away
+    Only a POST that never connected (e.g. connection refused) is retried, since nothing was sent.
+    Prints every retry, so rate limiting shows up in the logs.
+    """
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method == "POST":
+            return status_code == 429
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if method == "POST" and error is not None and not self._is_connection_error(error):
+            raise error.with_traceback(_stacktrace)  # the request may have reached Notion, don't send it twice
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)  # raises once we're out of retries
+        reason = response.status if response is not None else error
+        print(f"[notion] retry {len(new_retry.history)}/{_RETRY_TOTAL}: {method} {url} -> {reason}")
+        return new_retry
+
+_SESSION = requests.Session()
+_SESSION.headers.update(H)
+_RETRY_TOTAL = 8
+_RETRY = _NotionRetry(
+    total=_RETRY_TOTAL,
+    backoff_factor=0.5,                           # waits 0.5s, 1s, 2s, ... between attempts
+    status_forcelist=(429, 500, 502, 503, 504),
+    respect_retry_after_header=True,
+    raise_on_status=False,                        # after the last attempt hand back the response, so raise_for_status() reports it like before
+)
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=_RETRY))
+
+def _json_dumps(obj) -> bytes:
+    """Request body -> JSON bytes (sent with data=, the session already sets Content-Type: application/json)."""
+    return orjson.dumps(obj) if _ORJSON_AVAILABLE else json.dumps(obj).encode("utf-8")
+
+def _json_loads(content: bytes):
+    """Raw response bytes (r.content) -> Python object."""
+    return orjson.loads(content) if _ORJSON_AVAILABLE else json.loads(content)
+
 # ── 2) Helper: fetch the data source SCHEMA (column names & types) ───────────
+# The schema (columns) almost never changes, so it's cached in-process per ds_id for SCHEMA_TTL seconds:
+# ds_id -> (time.monotonic() when fetched, schema dict, ETag header or None)
+_schema_cache: dict[str, tuple] = {}
+
 def get_data_source_schema(ds_id: str) -> dict:
     """
     Returns the data source object (includes 'properties' dict).
     This lets you see the exact property names ('Amount', 'Date', etc.)
     and types ('number', 'date', 'title', 'select', ...).
+    Served from the in-process cache if it was fetched less than SCHEMA_TTL seconds ago.
+    After that, if Notion gave us an ETag, we revalidate with If-None-Match: a 304 means unchanged,
+    so the cached dict is reused without downloading/parsing it again. Without an ETag it's a normal refetch.
     """
+    cached = _schema_cache.get(ds_id)
+    if cached and time.monotonic() - cached[0] < SCHEMA_TTL:
+        return cached[1]
+
     url = f"https://api.notion.com/v1/data_sources/{ds_id}"
-    r = requests.get(url, headers=H, timeout=30)
+    etag = cached[2] if cached else None
+    r = _SESSION.get(url, headers={"If-None-Match": etag} if etag else None, timeout=30)
+    if r.status_code == 304 and cached:
+        _schema_cache[ds_id] = (time.monotonic(), cached[1], etag)  # still the same schema, restart its TTL
+        return cached[1]
     r.raise_for_status()           # crash with a clear error if Notion says no
-    return r.json()                # Python dict parsed from JSON response
+    schema = _json_loads(r.content)  # Python dict parsed from JSON response
+    _schema_cache[ds_id] = (time.monotonic(), schema, r.headers.get("ETag"))
+    return schema
+
+def invalidate_schema(ds_id: str) -> None:
+    """Forget the cached schema of ds_id, e.g. after renaming/adding columns, so the next call refetches it."""
+    _schema_cache.pop(ds_id, None)
 
 # ── 3) Helper: run a query to fetch rows/pages ───────────────────────────────
-def query_rows(ds_id: str, page_size=50, start_cursor=None, filter_=None, sorts=None) -> dict:
+def query_rows(ds_id: str, page_size=50, start_cursor=None, filter_=None, sorts=None, property_ids=None) -> dict:
     """
     Calls POST /v1/data_sources/{id}/query
     - page_size: how many rows to ask for in this request (Notion paginates)
     - start_cursor: "bookmark" to continue from the previous page of results
     - filter_: optional filter dict (e.g. { "property": "Category", "select": {"is_empty": True} })
     - sorts: optional sort rules (e.g. [{"property":"Date","direction":"descending"}])
+    - property_ids: optional list of property IDs (the schema's "id", not the name) to return;
+      Notion leaves every other column out of the response, so pages come back much smaller
     Returns the JSON dict with keys: results, has_more, next_cursor, etc.
     """
     body = {"page_size": page_size}
@@ -44,10 +131,14 @@ def query_rows(ds_id: str, page_size=50, start_cursor=None, filter_=None, sorts=
     if sorts:
         body["sorts"] = sorts
 
+    # filter_properties goes in the URL, once per id: ?filter_properties=<id>&filter_properties=<id>
+    # (Notion hands out the ids already URL-encoded, e.g. "a%3D"; unquote so requests doesn't encode them twice)
+    params = {"filter_properties": [unquote(pid) for pid in property_ids]} if property_ids else None
+
     url = f"https://api.notion.com/v1/data_sources/{ds_id}/query"
-    r = requests.post(url, headers=H, json=body, timeout=30)  # NOTE: POST, not PATCH
+    r = _SESSION.post(url, params=params, data=_json_dumps(body), timeout=30)  # NOTE: POST, not PATCH
     r.raise_for_status()
-    return r.json()
+    return _json_loads(r.content)
 
 # ── 4) Helpers to turn property objects into readable text ───────────────────
 # Each Notion property comes back with a 'type' and a value for that type.
@@ -56,11 +147,19 @@ def query_rows(ds_id: str, page_size=50, start_cursor=None, filter_=None, sorts=
 def text_of_title(prop: dict) -> str:
     # Title is an array of rich-text parts. We join their plain_text.
     arr = prop.get("title", []) # returns the value of the key in the dictionary or its equal to an empty list
-    return "".join(piece.get("plain_text", "") for piece in arr) if arr else ""
+    if not arr:
+        return ""
+    if len(arr) == 1:  # the usual case: one part, nothing to join
+        return arr[0].get("plain_text", "")
+    return "".join(piece.get("plain_text", "") for piece in arr)
 
 def text_of_rich(prop: dict) -> str:
     arr = prop.get("rich_text", [])
-    return "".join(piece.get("plain_text", "") for piece in arr) if arr else ""
+    if not arr:
+        return ""
+    if len(arr) == 1:  # the usual case: one part, nothing to join
+        return arr[0].get("plain_text", "")
+    return "".join(piece.get("plain_text", "") for piece in arr)
 
 def text_of_select(prop: dict) -> str:
     sel = prop.get("select")
@@ -77,6 +176,10 @@ def text_of_number(prop: dict) -> str:
     n = prop.get("number")
     return "" if n is None else str(n)
 
+def number_of(prop: dict):
+    # the raw number (int/float) or None; skips the str() -> float() round trip of text_of_number
+    return prop.get("number")
+
 def text_of_checkbox(prop: dict) -> str:
     v = prop.get("checkbox")
     return "true" if v else "false"
@@ -90,21 +193,27 @@ def text_of_formula(prop: dict) -> str:
     if t == "date":    return (f.get("date") or {}).get("start","")
     return ""
 
+# property type -> the text_of_* helper that reads it
+_COERCERS = {
+    "title": text_of_title,
+    "rich_text": text_of_rich,
+    "select": text_of_select,
+    "multi_select": text_of_multi,
+    "date": text_of_date,
+    "number": text_of_number,
+    "checkbox": text_of_checkbox,
+    "formula": text_of_formula,
+}
+
+def _empty(prop: dict) -> str:
+    return ""  # unknown/unsupported type
+
 def coerce_prop_value(prop_obj: dict) -> str:
     """
     Given a property object, return a readable string based on its type.
-    Extend this if you use url, email, phone_number, people, files, relation, rollup, etc.
+    Extend _COERCERS if you use url, email, phone_number, people, files, relation, rollup, etc.
     """
-    t = prop_obj.get("type")
-    if t == "title":        return text_of_title(prop_obj)
-    if t == "rich_text":    return text_of_rich(prop_obj)
-    if t == "select":       return text_of_select(prop_obj)
-    if t == "multi_select": return text_of_multi(prop_obj)
-    if t == "date":         return text_of_date(prop_obj)
-    if t == "number":       return text_of_number(prop_obj)
-    if t == "checkbox":     return text_of_checkbox(prop_obj)
-    if t == "formula":      return text_of_formula(prop_obj)
-    return ""  # default: unknown/unsupported type
+    return _COERCERS.get(prop_obj.get("type"), _empty)(prop_obj)  # one dict lookup instead of an if-chain
 
 class NotionManager:
     def __init__(self):
@@ -112,9 +221,31 @@ class NotionManager:
         self.latest_amounts_in_record = []
         self.latest_names_in_record = []
 
+        # property (column) names of the title / date / amount columns, looked up from the schema in read_rows
+        self._title_key = None
+        self._date_key = None
+        self._amount_key = None
+
         # get all the notion data first
         self.read_rows(DS_ID, limit=20)
 
+    # ── 4b) Find the columns we read, once, from the schema ─────────────────────
+    def _find_column_keys(self, props: dict):
+        """
+        Look up in the schema's properties (see get_data_source_schema) which property holds the title, the date and
+        the amount, so read_rows can do three direct lookups per row instead of scanning every property of every row.
+        Prefers the columns add_row writes to ('Expense Record', 'Date', 'Amount'); otherwise the first column of that type.
+        """
+
+        def _key_for(prop_type: str, preferred: str):
+            if props.get(preferred, {}).get("type") == prop_type:
+                return preferred
+            return next((name for name, p in props.items() if p.get("type") == prop_type), None)
+
+        self._title_key = _key_for("title", "Expense Record")
+        self._date_key = _key_for("date", "Date")
+        self._amount_key = _key_for("number", "Amount")
+
     # ── 5) Print rows: pulls pages, loops with pagination, prints one line per row ─
     def read_rows(self, ds_id: str, limit=20):
         """
@@ -127,48 +258,67 @@ class NotionManager:
 
         seen = 0
         cursor = None
+        # ONE schema request per read (it's also what filter_properties below needs the property ids from)
+        schema_props = get_data_source_schema(ds_id).get("properties", {})
+        self._find_column_keys(schema_props)
+
+        # The three columns we read and how to read each one, picked ONCE before the loop. _find_column_keys chose
+        # them by schema type, so the reader follows from that: date -> text_of_date, title -> text_of_title and,
+        # for the amount, number_of (the raw number, not text).
+        date_key, title_key, amount_key = self._date_key, self._title_key, self._amount_key
+        read_date, read_title, read_amount = text_of_date, text_of_title, number_of
+        # one (date, name, amount) tuple per row, written by index into a buffer sized ONCE; split into the lists at the end
+        rows = [None] * limit
 
-        for _ in range(
-                PAGE_SIZE):  # we cannot have while True loops in python anywhere, so this is the next best alternative, since we are only getting 20 entries, there's no way it will go up to 50 which is our pre-defined limit
+        # only ask Notion for those columns (by property id)
+        property_ids = [schema_props[key]["id"] for key in (date_key, title_key, amount_key)
+                        if key and "id" in schema_props[key]]
+
+        # not a `while True` (we can't have those on python anywhere): the loop ends once we have 'limit' rows,
+        # or (below) when Notion says there are no more pages
+        while seen < limit:
 
             # Ask for the next chunk of rows (page); Notion will give next_cursor if there are more
             page_size = min(PAGE_SIZE,
-                            limit - seen)  # don’t fetch more than we need -> we will never exceed the PAGE_SIZE limit which is 50
-            data = query_rows(ds_id, page_size=page_size, start_cursor=cursor, filter_=FILTER_QUERY, sorts=SORT_QUERY)
+                            limit - seen)  # don’t fetch more than we need; any limit <= PAGE_SIZE (100) is a single request
+            data = query_rows(ds_id, page_size=page_size, start_cursor=cursor, filter_=FILTER_QUERY, sorts=SORT_QUERY,
+                              property_ids=property_ids)
             for page in data["results"]:
                 props = page["properties"]
 
-                for k, v in props.items():
-                    if v.get("type") == "date":
-                        # print(v, "🔴")
-                        date = coerce_prop_value(v)
-                        self.latest_dates_in_record.append(date)
-
-                    if v.get("type") == "title":
-                        record_name = coerce_prop_value(v)
-                        self.latest_names_in_record.append(record_name)
-
-                    if v.get("type") == "number":
-                        record_amount = coerce_prop_value(v)
-                        self.latest_amounts_in_record.append(float(record_amount))
+                # direct lookups of those columns, no per-row type checks
+                rows[seen] = (read_date(props.get(date_key, {})),
+                              read_title(props.get(title_key, {})),
+                              read_amount(props.get(amount_key, {})))
 
                 seen += 1
                 if seen >= limit:
-                    print(self.latest_dates_in_record)
-                    print(self.latest_amounts_in_record)
-                    print(self.latest_names_in_record)
-                    return  # stop once we hit the requested limit
+                    break  # stop once we hit the requested limit
 
             # Handle pagination: if there are more rows, continue from next_cursor
-            if not data.get("has_more"):
+            # (an empty page also stops the loop, so a misbehaving response can't keep us spinning)
+            if not data.get("has_more") or not data["results"]:
                 break
-            cursor = data.get("next_cursor")
+            cursor = data["next_cursor"]
 
-    def add_row(self, record_name, record_amount: float, record_date: str):
+        # split the row tuples into the three lists (skipping a column the data source doesn't have)
+        columns = ((date_key, self.latest_dates_in_record),
+                   (title_key, self.latest_names_in_record),
+                   (amount_key, self.latest_amounts_in_record))
+        for (key, column), values in zip(columns, zip(*rows[:seen])):
+            if key:
+                column.extend(values)
+        if seen >= limit:
+            print(self.latest_dates_in_record)
+            print(self.latest_amounts_in_record)
+            print(self.latest_names_in_record)
+
+    @staticmethod
+    def _row_body(record_name, record_amount: float, record_date: str) -> dict:
         # Minimal body to create a row in your data source:
         # - parent identifies WHERE the page (row) is created: here, a data source.
         # - properties provides column values; at minimum, set the Title column.
-        body = {
+        return {
             "parent": {"data_source_id": DS_ID},  # <- key change: no "type" field, per 2025-09-03 docs
             "properties": {
                 # Replace "Name" if your title column is named differently.
@@ -184,8 +334,35 @@ class NotionManager:
             }
         }
 
+    @staticmethod
+    def _post_page(body: dict) -> str:
         # POST /v1/pages creates a page (row). If this succeeds (status 200),
         # the response JSON has the new page's id at ["id"].
-        r = requests.post("https://api.notion.com/v1/pages", headers=H, json=body, timeout=(10, 45))
+        r = _SESSION.post("https://api.notion.com/v1/pages", data=_json_dumps(body), timeout=(10, 45))
         r.raise_for_status()
-        print("Created page id:", r.json()["id"])
+        page_id = _json_loads(r.content)["id"]
+        print("Created page id:", page_id)
+        return page_id
+
+    def add_row(self, record_name, record_amount: float, record_date: str):
+        return self._post_page(self._row_body(record_name, record_amount, record_date))
+
+    def add_rows(self, records: list[tuple]) -> list:
+        """
+        Create many rows at once. records is a list of (record_name, record_amount, record_date) tuples.
+        Notion has no batch-create endpoint, so the inserts are sent concurrently instead (at most
+        ADD_ROWS_WORKERS at a time, all sharing the pooled _SESSION connections).
+        Returns one entry per record, in the same order: the new page id, or the exception that insert raised
+        (one failed row doesn't stop the others).
+        """
+        bodies = [self._row_body(name, amount, date) for name, amount, date in records]  # build everything up-front
+
+        def _safe_post(body):
+            try:
+                return self._post_page(body)
+            except Exception as e:
+                print(f"[notion] add_rows insert failed: {e}")
+                return e
+
+        with ThreadPoolExecutor(max_workers=ADD_ROWS_WORKERS) as executor:
+            return list(executor.map(_safe_post, bodies))
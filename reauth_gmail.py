@@ -1,9 +1,25 @@
 # reauth_gmail.py  (run on your laptop)
+import os
+import tempfile
+
 from google_auth_oauthlib.flow import InstalledAppFlow
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
+TOKEN_PATH = "secrets/gmail_token.json"
 
 flow = InstalledAppFlow.from_client_secrets_file("secrets/Desktop app.json", SCOPES)
 creds = flow.run_local_server(port=0, access_type="offline", prompt="consent")
-open("secrets/gmail_token.json", "w").write(creds.to_json())
+
+# write to a temp file next to the token, then swap it in, so a crash mid-write never leaves a half-written token
+fd, tmp = tempfile.mkstemp(dir=os.path.dirname(TOKEN_PATH), suffix=".tmp")
+try:
+    with os.fdopen(fd, "w") as f:
+        f.write(creds.to_json())
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp, 0o600)  # only we can read the token
+    os.replace(tmp, TOKEN_PATH)
+except BaseException:
+    os.remove(tmp)
+    raise
 print("Wrote gmail_token.json")